@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import contextlib
+import random
+import sys
+import time
+
+# Handshake status codes that will not succeed on retry
+FATAL_STATUSES = {
+    401: "Invalid API key or customer ID.",
+    402: "Insufficient balance.",
+    403: "Customer has been deactivated",
+}
+
+
+class AdmissionClosed(Exception):
+    pass
+
+
+class AdmissionController:
+    """
+    Decides when a new session may connect. One controller is shared by all
+    sessions of a process.
+
+    - A token bucket limits new sessions per second.
+    - The audio-seconds of sessions in flight are capped, so a few long
+      files and many short ones put a similar load on the server. A file
+      longer than the cap is admitted once nothing else is in flight.
+    - Overload signals (handshake 429/5xx, connection errors, server
+      `error` messages with a 429/5xx code) halve the session rate and pause admission with an
+      exponential backoff. Every successful handshake raises the rate again
+      by a tenth of the configured maximum, so the rate settles at what the
+      account and server can sustain.
+    - Fatal handshake statuses (401, 402, 403) close the controller and
+      every pending or later session fails fast instead of retrying.
+    """
+
+    def __init__(
+        self,
+        sessions_per_second=10.0,
+        max_audio_seconds=None,
+        max_retries=3,
+        max_backoff=60.0,
+    ):
+        self.max_rate = sessions_per_second
+        self.rate = sessions_per_second
+        self.min_rate = sessions_per_second / 100
+        self.max_audio_seconds = max_audio_seconds
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.audio_seconds = 0.0
+        self.in_flight = 0
+        self.backoff = 0.0
+        self.paused_until = 0.0
+        self.closed_reason = None
+
+        self._lock = asyncio.Lock()
+        self._released = asyncio.Event()
+
+    @contextlib.asynccontextmanager
+    async def admit(self, audio_seconds):
+        await self._acquire(audio_seconds)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.audio_seconds -= audio_seconds
+            self._released.set()
+
+    async def _acquire(self, audio_seconds):
+        # Sessions are admitted one at a time, in arrival order
+        async with self._lock:
+            while not self._fits(audio_seconds):
+                self._check_closed()
+                self._released.clear()
+                await self._released.wait()
+
+            while True:
+                self._check_closed()
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    break
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+            self.in_flight += 1
+            self.audio_seconds += audio_seconds
+
+    def _fits(self, audio_seconds):
+        return (
+            self.closed_reason is not None
+            or self.max_audio_seconds is None
+            or self.in_flight == 0
+            or self.audio_seconds + audio_seconds <= self.max_audio_seconds
+        )
+
+    def _check_closed(self):
+        if self.closed_reason is not None:
+            raise AdmissionClosed(self.closed_reason)
+
+    def close(self, reason):
+        if self.closed_reason is None:
+            self.closed_reason = reason
+            print(f"Admission stopped: {reason}", file=sys.stderr)
+        self._released.set()
+
+    def on_success(self):
+        self.backoff = 0.0
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def on_overload(self, reason):
+        now = time.monotonic()
+        # Sessions failing together report the same overload, react once
+        if now < self.paused_until:
+            return
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.backoff = min(self.max_backoff, max(1.0, self.backoff * 2))
+        # Jitter so that separate clients do not retry in lockstep
+        self.paused_until = now + self.backoff * random.uniform(0.5, 1.0)
+        print(
+            f"Backing off for up to {self.backoff:.1f}s, "
+            f"admitting {self.rate:.2f} sessions/s ({reason})",
+            file=sys.stderr,
+        )
+
+    def on_handshake_error(self, status):
+        """
+        Returns:
+        - bool: Whether the session should be retried.
+        """
+        if status in FATAL_STATUSES:
+            self.close(FATAL_STATUSES[status])
+            return False
+        if status == 429 or status >= 500:
+            self.on_overload(f"handshake status {status}")
+            return True
+        return False
+
+    def on_server_error(self, response_data):
+        """
+        Returns:
+        - bool: Whether the error signals overload. Other errors, such as
+          a rejected config, do not change the session rate.
+        """
+        code = response_data.get("code")
+        if code in FATAL_STATUSES:
+            self.close(FATAL_STATUSES[code])
+            return False
+        if isinstance(code, int) and (code == 429 or code >= 500):
+            self.on_overload(
+                f"server error {response_data.get('error')}: {response_data.get('message')}"
+            )
+            return True
+        return False
+
+
+def admission_arguments():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--sessions-per-second",
+        type=float,
+        default=10.0,
+        help="maximum rate of new sessions, lowered automatically on overload",
+    )
+    parser.add_argument(
+        "--max-audio-seconds",
+        type=float,
+        help="cap on the total audio duration of sessions in flight",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="retries of a session rejected with 429/5xx or a connection error",
+    )
+    return parser
+
+
+def create_admission(args):
+    return AdmissionController(
+        sessions_per_second=args.sessions_per_second,
+        max_audio_seconds=args.max_audio_seconds,
+        max_retries=args.retries,
+    )
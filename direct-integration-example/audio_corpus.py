@@ -0,0 +1,159 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import wave
+
+# File layout:
+#   header (HEADER_FORMAT): magic, version, index offset, index length
+#   raw PCM of every wave file, back to back
+#   JSON index: [{"name", "offset", "length", "sample_rate", "channels", "sample_width"}, ...]
+MAGIC = b"BODHIPCK"
+VERSION = 1
+HEADER_FORMAT = "<8sIQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+def pack(directory, output_path):
+    """
+    Packs every .wav file under directory into a single corpus file.
+
+    Returns:
+    - int: Number of packed files.
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if filename.lower().endswith(".wav"):
+                paths.append(os.path.join(root, filename))
+    paths.sort()
+
+    index = []
+    with open(output_path, "wb") as out:
+        # Placeholder header, rewritten once the index position is known
+        out.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, 0, 0))
+
+        for path in paths:
+            try:
+                with wave.open(path, "rb") as wf:
+                    channels, sample_width, sample_rate, num_frames, _, _ = (
+                        wf.getparams()
+                    )
+                    data = wf.readframes(num_frames)
+            except (wave.Error, EOFError) as e:
+                print(f"Skipping {path}: {e}", file=sys.stderr)
+                continue
+
+            index.append(
+                {
+                    "name": os.path.relpath(path, directory),
+                    "offset": out.tell(),
+                    "length": len(data),
+                    "sample_rate": sample_rate,
+                    "channels": channels,
+                    "sample_width": sample_width,
+                }
+            )
+            out.write(data)
+
+        index_offset = out.tell()
+        index_data = json.dumps(index).encode()
+        out.write(index_data)
+
+        out.seek(0)
+        out.write(
+            struct.pack(HEADER_FORMAT, MAGIC, VERSION, index_offset, len(index_data))
+        )
+
+    return len(index)
+
+
+class AudioCorpus:
+    """
+    Read-only view of a packed corpus. The file is memory-mapped once and
+    read() hands out memoryview slices of it, so no audio is copied until
+    it is written to the socket.
+
+    Views of the corpus (from read() or slices of it) that are still
+    referenced when close() is called, for example from the traceback of an
+    interrupted run, keep the mapping open until they are garbage collected.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_offset, index_length = struct.unpack_from(
+            HEADER_FORMAT, self.mmap
+        )
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a packed audio corpus")
+
+        self.entries = json.loads(self.mmap[index_offset : index_offset + index_length])
+        self.buffer = memoryview(self.mmap)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def read(self, entry):
+        return self.buffer[entry["offset"] : entry["offset"] + entry["length"]]
+
+    def close(self):
+        if getattr(self, "buffer", None) is not None:
+            self.buffer.release()
+            self.buffer = None
+        try:
+            self.mmap.close()
+        except BufferError:
+            # Views are still exported, the mapping is unmapped once they
+            # are collected. Raising here would hide the exception that
+            # interrupted the run.
+            pass
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pack a directory of wave files into a single corpus file"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack_parser = subparsers.add_parser("pack", help="Create a corpus file")
+    pack_parser.add_argument("directory", help="Directory with wave files")
+    pack_parser.add_argument("output", help="Path of the corpus file to write")
+
+    list_parser = subparsers.add_parser("list", help="List the entries of a corpus")
+    list_parser.add_argument("corpus", help="Path of the corpus file")
+
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        count = pack(args.directory, args.output)
+        print(f"Packed {count} files into {args.output}")
+    else:
+        with AudioCorpus(args.corpus) as corpus:
+            for entry in corpus:
+                duration = entry["length"] / (
+                    entry["sample_rate"] * entry["sample_width"] * entry["channels"]
+                )
+                print(
+                    f"{entry['name']}: {duration:.2f}s, "
+                    f"Sample Rate = {entry['sample_rate']} Hz, "
+                    f"Channels = {entry['channels']}"
+                )
+
+
+if __name__ == "__main__":
+    main()
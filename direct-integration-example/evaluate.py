@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import csv
+import importlib
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+import wave
+
+from admission import admission_arguments, create_admission
+from streaming import (
+    DEFAULT_MODEL,
+    MODELS,
+    chunk_pcm,
+    create_session,
+    stream_pcm,
+)
+
+# The non-streaming client lives in a file with a dash in its name
+non_streaming_api = importlib.import_module("non-streaming-api")
+
+
+def normalize(text):
+    """
+    Case-folds, strips punctuation and collapses whitespace. Only Unicode
+    punctuation is removed so vowel signs of Indic scripts are preserved.
+    """
+    text = "".join(
+        " " if unicodedata.category(char).startswith("P") else char
+        for char in text.casefold()
+    )
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def edit_distance(reference, hypothesis):
+    """
+    Levenshtein distance between two token sequences using the bit-parallel
+    algorithm of Myers/Hyyrö. One Python integer holds a whole DP column, so
+    the cost is O(len(hypothesis)) big-integer operations instead of
+    O(len(reference) * len(hypothesis)) Python steps, which keeps long
+    transcripts cheap.
+    """
+    m = len(reference)
+    if m == 0:
+        return len(hypothesis)
+
+    # Bitmask of the positions where every token occurs in the reference
+    peq = {}
+    for i, token in enumerate(reference):
+        peq[token] = peq.get(token, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+
+    for token in hypothesis:
+        eq = peq.get(token, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh = mh << 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+
+    return score
+
+
+def error_counts(reference, hypothesis):
+    """
+    Returns:
+    - tuple: (word errors, reference words, char errors, reference chars)
+    """
+    reference = normalize(reference)
+    hypothesis = normalize(hypothesis)
+    reference_words = reference.split()
+    return (
+        edit_distance(reference_words, hypothesis.split()),
+        len(reference_words),
+        edit_distance(reference, hypothesis),
+        len(reference),
+    )
+
+
+def load_manifest(path):
+    """
+    Reads a JSON lines manifest, one {"audio": ..., "text": ...} object per
+    line. Audio paths are relative to the manifest.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    items = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item["audio"] = os.path.join(base_dir, item["audio"])
+            with wave.open(item["audio"], "rb") as wf:
+                item["duration"] = wf.getnframes() / wf.getframerate()
+            items.append(item)
+    return items
+
+
+async def transcribe_streaming(session, uri, item, model, admission):
+    with wave.open(item["audio"], "rb") as wf:
+        channels, sample_width, sample_rate, num_samples, _, _ = wf.getparams()
+        data = wf.readframes(num_samples)
+
+    chunks = chunk_pcm(data, sample_rate * sample_width * channels)
+    timings = {}
+    sentences = await stream_pcm(
+        session,
+        uri,
+        chunks,
+        sample_rate,
+        model,
+        timings=timings,
+        verbose=False,
+        admission=admission,
+    )
+    if sentences is None:
+        return None, None
+    return " ".join(sentences), timings["finalization_latency"]
+
+
+async def transcribe_non_streaming(url, item, model):
+    start = time.monotonic()
+    data = await asyncio.to_thread(
+        non_streaming_api.transcribe_audio, item["audio"], model, url, False
+    )
+    if data is None:
+        return None, None
+    # The whole request is spent waiting for the final transcript
+    return data["text"], time.monotonic() - start
+
+
+async def evaluate_model(args, items, model, api_key, customer_id, admission):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    async def evaluate_item(session, item):
+        async with semaphore:
+            start = time.monotonic()
+            if args.api == "streaming":
+                text, latency = await transcribe_streaming(
+                    session, args.uri, item, model, admission
+                )
+            else:
+                text, latency = await transcribe_non_streaming(args.url, item, model)
+            elapsed = time.monotonic() - start
+
+        result = {
+            "model": model,
+            "audio": item["audio"],
+            "duration": item["duration"],
+            "rtf": elapsed / item["duration"] if item["duration"] else 0.0,
+            "finalization_latency": latency,
+            "hypothesis": text,
+        }
+        if text is not None:
+            (
+                result["word_errors"],
+                result["words"],
+                result["char_errors"],
+                result["chars"],
+            ) = error_counts(item["text"], text)
+        results.append(result)
+
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+
+    async with create_session(api_key, customer_id, args.uri) as session:
+        await asyncio.gather(*(evaluate_item(session, item) for item in items))
+
+    summary = summarize(
+        model,
+        results,
+        time.monotonic() - wall_start,
+        time.process_time() - cpu_start,
+    )
+    return summary, results
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(model, results, wall_time, cpu_time):
+    done = [r for r in results if r["hypothesis"] is not None]
+    words = sum(r["words"] for r in done)
+    chars = sum(r["chars"] for r in done)
+    audio_seconds = sum(r["duration"] for r in done)
+    latencies = [r["finalization_latency"] for r in done]
+
+    return {
+        "model": model,
+        "files": len(results),
+        "failed": len(results) - len(done),
+        "wer": sum(r["word_errors"] for r in done) / words if words else float("nan"),
+        "cer": sum(r["char_errors"] for r in done) / chars if chars else float("nan"),
+        "mean_rtf": sum(r["rtf"] for r in done) / len(done) if done else float("nan"),
+        "throughput": audio_seconds / wall_time if wall_time else float("nan"),
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "cpu_per_audio_second": (
+            cpu_time / audio_seconds if audio_seconds else float("nan")
+        ),
+    }
+
+
+def print_summary(summaries):
+    print(
+        f"{'Model':<22}{'Files':>7}{'Failed':>8}{'WER':>8}{'CER':>8}"
+        f"{'RTF':>7}{'xRT':>8}{'Lat p50':>9}{'Lat p95':>9}{'CPU/s':>9}"
+    )
+    for s in summaries:
+        print(
+            f"{s['model']:<22}{s['files']:>7}{s['failed']:>8}"
+            f"{s['wer']:>8.2%}{s['cer']:>8.2%}{s['mean_rtf']:>7.2f}"
+            f"{s['throughput']:>8.1f}{s['latency_p50']:>8.2f}s{s['latency_p95']:>8.2f}s"
+            f"{s['cpu_per_audio_second']:>8.4f}s"
+        )
+
+
+def write_results(path, results):
+    fields = [
+        "model",
+        "audio",
+        "duration",
+        "rtf",
+        "finalization_latency",
+        "word_errors",
+        "words",
+        "char_errors",
+        "chars",
+        "hypothesis",
+    ]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+
+async def main():
+    # Fetch API key and customer ID from environment variables
+    api_key = os.environ.get("API_KEY")
+    customer_id = os.environ.get("CUSTOMER_ID")
+
+    if not api_key or not customer_id:
+        print("Please set API key and customer ID in environment variables.")
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Measure accuracy and speed of models against reference transcripts",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        parents=[admission_arguments()],
+    )
+    parser.add_argument(
+        "manifest",
+        help='JSON lines file with one {"audio": "file.wav", "text": "reference"} per line',
+    )
+    parser.add_argument(
+        "--api",
+        choices=["streaming", "non-streaming"],
+        default="streaming",
+        help="Client to transcribe with",
+    )
+    parser.add_argument(
+        "-u",
+        "--uri",
+        type=str,
+        metavar="URL",
+        default="wss://bodhi.navana.ai",
+        help="Streaming server URL",
+    )
+    parser.add_argument(
+        "--url",
+        type=str,
+        default="https://bodhi.navana.ai/api/transcribe",
+        help="Non-streaming API URL",
+    )
+    parser.add_argument(
+        "-m",
+        "--model",
+        dest="models",
+        action="append",
+        choices=MODELS,
+        help=f"Model to evaluate, can be repeated (default: {DEFAULT_MODEL})",
+    )
+    parser.add_argument(
+        "-n",
+        "--concurrency",
+        type=int,
+        default=10,
+        help="Number of files transcribed concurrently",
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, help="CSV file with per-file results"
+    )
+
+    args = parser.parse_args()
+
+    if args.api == "non-streaming":
+        defaults = vars(admission_arguments().parse_args([]))
+        passed = [
+            "--" + dest.replace("_", "-")
+            for dest, default in defaults.items()
+            if getattr(args, dest) != default
+        ]
+        if passed:
+            parser.error(f"{', '.join(passed)} can only be used with --api streaming")
+
+    items = load_manifest(args.manifest)
+    print(
+        f"Evaluating {len(items)} files, "
+        f"{sum(item['duration'] for item in items):.1f}s of audio",
+        file=sys.stderr,
+    )
+
+    # Admission control paces websocket sessions, HTTP requests are only
+    # bounded by --concurrency
+    admission = create_admission(args) if args.api == "streaming" else None
+    summaries = []
+    all_results = []
+    # Models run one after another so the client CPU time of each is separate
+    for model in args.models or [DEFAULT_MODEL]:
+        summary, results = await evaluate_model(
+            args, items, model, api_key, customer_id, admission
+        )
+        summaries.append(summary)
+        all_results.extend(results)
+
+    print_summary(summaries)
+    if args.output:
+        write_results(args.output, all_results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import os
+import time
+import wave
+
+import mock_server
+from loop_monitor import LoopMonitor, use_uvloop
+from streaming import chunk_pcm, create_session, stream_pcm
+
+
+async def run_sessions(uri, chunks, sample_rate, sessions):
+    # Only lag is sampled: timing every task step would add the same
+    # Python-level cost to both loops and blur their CPU difference
+    monitor = LoopMonitor(verbose=False, time_tasks=False)
+    monitor.start()
+
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+
+    async with create_session("benchmark", "benchmark", uri) as session:
+        results = await asyncio.gather(
+            *(
+                stream_pcm(session, uri, chunks, sample_rate, verbose=False)
+                for _ in range(sessions)
+            )
+        )
+
+    wall_time = time.monotonic() - wall_start
+    cpu_time = time.process_time() - cpu_start
+    await monitor.stop()
+
+    return {
+        "failed": sum(result is None for result in results),
+        "wall": wall_time,
+        "cpu": cpu_time,
+        "lag_mean": monitor.histogram.sum / max(monitor.histogram.total, 1),
+        "lag_p99": monitor.histogram.percentile(0.99),
+        "lag_max": monitor.histogram.max,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the default asyncio loop and uvloop under many streaming sessions",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-f",
+        "--file",
+        type=str,
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "..", "loan.wav"
+        ),
+        help="wave/audio file streamed by every session",
+    )
+    parser.add_argument(
+        "--seconds",
+        type=float,
+        default=10,
+        help="Seconds of the file to stream per session",
+    )
+    parser.add_argument(
+        "-n",
+        "--sessions",
+        type=int,
+        nargs="+",
+        default=[50, 100, 200, 400],
+        help="Concurrent session counts to benchmark",
+    )
+    parser.add_argument(
+        "--policies",
+        nargs="+",
+        choices=["asyncio", "uvloop"],
+        default=["asyncio", "uvloop"],
+        help="Event loop policies to compare",
+    )
+    args = parser.parse_args()
+
+    with wave.open(args.file, "rb") as wf:
+        channels, sample_width, sample_rate, num_samples, _, _ = wf.getparams()
+        byte_rate = sample_rate * sample_width * channels
+        data = wf.readframes(min(num_samples, int(args.seconds * sample_rate)))
+    chunks = chunk_pcm(data, byte_rate)
+    audio_seconds = len(data) / byte_rate
+
+    server, port = mock_server.start_subprocess()
+    uri = f"ws://127.0.0.1:{port}/"
+
+    print(
+        f"{'Loop':<9}{'Sessions':>9}{'Failed':>8}{'Wall':>8}{'CPU':>8}"
+        f"{'CPU/audio s':>13}{'Lag mean':>10}{'Lag p99':>10}{'Lag max':>10}"
+    )
+    try:
+        for policy in args.policies:
+            if policy == "uvloop":
+                use_uvloop()
+            else:
+                asyncio.set_event_loop_policy(None)
+
+            for sessions in args.sessions:
+                r = asyncio.run(run_sessions(uri, chunks, sample_rate, sessions))
+                print(
+                    f"{policy:<9}{sessions:>9}{r['failed']:>8}"
+                    f"{r['wall']:>7.2f}s{r['cpu']:>7.2f}s"
+                    f"{r['cpu'] / (sessions * audio_seconds) * 1000:>10.3f} ms"
+                    f"{r['lag_mean']:>7.2f} ms{r['lag_p99']:>7.2f} ms"
+                    f"{r['lag_max']:>7.2f} ms"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import bisect
+import collections.abc
+import sys
+import time
+
+# Upper bounds of the lag histogram buckets, in milliseconds
+LAG_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+def use_uvloop():
+    """
+    Switches asyncio to the uvloop event loop policy. Must be called before
+    the event loop is created, i.e. before asyncio.run().
+    """
+    try:
+        import uvloop
+    except ImportError:
+        print("Please install uvloop first. You can use")
+        print()
+        print("  pip install uvloop")
+        print()
+        sys.exit(-1)
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+class LagHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, lag_ms):
+        self.counts[bisect.bisect_left(LAG_BUCKETS_MS, lag_ms)] += 1
+        self.total += 1
+        self.sum += lag_ms
+        self.max = max(self.max, lag_ms)
+
+    def percentile(self, fraction):
+        """
+        Upper bound of the bucket holding the given fraction of samples,
+        capped at the largest lag seen.
+        """
+        if not self.total:
+            return 0.0
+        seen = 0
+        for bound, count in zip(LAG_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= fraction * self.total:
+                return min(bound, self.max)
+        return self.max
+
+    def format(self):
+        lines = []
+        lower = 0
+        for bound, count in zip(LAG_BUCKETS_MS + [None], self.counts):
+            label = f"{lower}-{bound} ms" if bound is not None else f">{lower} ms"
+            share = count / self.total if self.total else 0.0
+            lines.append(f"  {label:>14}: {count:>8} {'#' * round(40 * share)}")
+            lower = bound
+        return "\n".join(lines)
+
+
+class _TimedCoroutine(collections.abc.Coroutine):
+    """
+    Wraps a task's coroutine and times every step it runs on the event
+    loop, i.e. the time between two awaits that actually suspend.
+    """
+
+    def __init__(self, coro, on_step):
+        self._coro = coro
+        self._on_step = on_step
+        # Task reprs, Task.get_stack() and asyncio's debug messages look
+        # the coroutine up through these. __qualname__ cannot be a property
+        # of a class, and names do not change, so they are copied.
+        self.__name__ = getattr(coro, "__name__", None)
+        self.__qualname__ = getattr(coro, "__qualname__", None)
+
+    @property
+    def cr_code(self):
+        return getattr(self._coro, "cr_code", None)
+
+    @property
+    def cr_frame(self):
+        return getattr(self._coro, "cr_frame", None)
+
+    @property
+    def cr_running(self):
+        return getattr(self._coro, "cr_running", False)
+
+    @property
+    def cr_await(self):
+        return getattr(self._coro, "cr_await", None)
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._on_step(self._coro, time.perf_counter() - start)
+
+    def send(self, value):
+        return self._timed(self._coro.send, value)
+
+    def throw(self, *args):
+        return self._timed(self._coro.throw, *args)
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+    def __repr__(self):
+        return repr(self._coro)
+
+
+class LoopMonitor:
+    """
+    Samples event loop lag and detects slow callbacks.
+
+    Lag is how late a sleep of `interval` seconds wakes up: a starved loop
+    wakes everything late, while a slow network or server does not.
+
+    Slow callbacks are found by installing a task factory that times every
+    step of every task created afterwards. Steps longer than
+    `slow_callback` seconds are reported with the name of the task's
+    coroutine (send_audio, receive_transcription, ...). This works with
+    both the default loop and uvloop. Timing every step costs CPU in
+    Python; with time_tasks=False only lag is sampled.
+    """
+
+    def __init__(
+        self, interval=0.01, slow_callback=0.05, verbose=True, time_tasks=True
+    ):
+        self.interval = interval
+        self.slow_callback = slow_callback
+        self.verbose = verbose
+        self.time_tasks = time_tasks
+        self.histogram = LagHistogram()
+        self.slow_steps = collections.Counter()
+        self.slowest_step = collections.defaultdict(float)
+        self._task = None
+        self._loop = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        if self.time_tasks:
+            self._loop.set_task_factory(self._task_factory)
+        self._task = self._loop.create_task(self._sample())
+
+    async def stop(self):
+        if self.time_tasks:
+            self._loop.set_task_factory(None)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def _task_factory(self, loop, coro, **kwargs):
+        if asyncio.iscoroutine(coro) and not isinstance(coro, _TimedCoroutine):
+            coro = _TimedCoroutine(coro, self._on_step)
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    def _on_step(self, coro, duration):
+        if duration < self.slow_callback:
+            return
+        name = getattr(coro, "__qualname__", repr(coro))
+        self.slow_steps[name] += 1
+        self.slowest_step[name] = max(self.slowest_step[name], duration)
+        if self.verbose:
+            print(
+                f"Slow callback: {name} blocked the event loop for {duration * 1000:.1f} ms",
+                file=sys.stderr,
+            )
+
+    async def _sample(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - start - self.interval
+            self.histogram.add(max(lag, 0.0) * 1000)
+
+    def report(self):
+        h = self.histogram
+        lines = [
+            f"Event loop lag ({type(self._loop).__module__.split('.')[0]}): "
+            f"samples={h.total}, "
+            f"mean={h.sum / h.total if h.total else 0.0:.2f} ms, "
+            f"p50<={h.percentile(0.5):.2f} ms, "
+            f"p99<={h.percentile(0.99):.2f} ms, "
+            f"max={h.max:.2f} ms",
+            h.format(),
+        ]
+        if self.slow_steps:
+            lines.append(f"Slow callbacks (>{self.slow_callback * 1000:g} ms):")
+            for name, count in self.slow_steps.most_common():
+                lines.append(
+                    f"  {name}: {count} times, "
+                    f"slowest {self.slowest_step[name] * 1000:.1f} ms"
+                )
+        return "\n".join(lines)
+
+
+def loop_arguments():
+    """
+    Command line options shared by the asyncio clients. Returned as a
+    parent parser so it can be pre-parsed before the event loop exists.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--uvloop",
+        action="store_true",
+        help="run on the uvloop event loop instead of the default asyncio loop",
+    )
+    parser.add_argument(
+        "--monitor-loop",
+        action="store_true",
+        help="report event loop lag and slow callbacks on exit",
+    )
+    parser.add_argument(
+        "--slow-callback-ms",
+        type=float,
+        default=50,
+        help="steps blocking the event loop longer than this are reported",
+    )
+    return parser
@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+import wave
+
+from aiohttp import web, WSMsgType
+
+# Local stand-in for the Bodhi endpoints, for benchmarks and testing without
+# credentials. It speaks the same protocol but does no recognition: it emits
+# a partial transcript every PARTIAL_SECONDS of received audio and closes a
+# segment every --segment-seconds.
+PARTIAL_SECONDS = 0.1
+
+
+def error_message(error, message, code):
+    return json.dumps(
+        {
+            "error": error,
+            "message": message,
+            "code": code,
+            "timestamp": time.time(),
+        }
+    )
+
+
+async def streaming_handler(request):
+    options = request.app["options"]
+    state = request.app["state"]
+    if options.max_sessions and state["active_sessions"] >= options.max_sessions:
+        return web.Response(status=429, text="Too many concurrent sessions")
+
+    state["active_sessions"] += 1
+    try:
+        return await stream_session(request, options)
+    finally:
+        state["active_sessions"] -= 1
+
+
+async def stream_session(request, options):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+
+    call_id = str(uuid.uuid4())
+    config = None
+    byte_rate = None
+    received = 0
+    segment_id = 0
+    segment_start = 0
+    last_partial = 0
+
+    def response(text, transcript_type, eos=False):
+        tokens = text.split()
+        if options.stamp:
+            # Send time, used to measure client-side dispatch latency
+            text = f"{text} @{time.time():.6f}"
+        return json.dumps(
+            {
+                "call_id": call_id,
+                "segment_id": segment_id,
+                "eos": eos,
+                "type": transcript_type,
+                "text": text,
+                "segment_meta": {
+                    "tokens": tokens,
+                    "timestamps": [0.1 * i for i in range(len(tokens))],
+                    "start_time": segment_start / byte_rate if byte_rate else 0.0,
+                    "confidence": 1.0,
+                    "words": [{"word": token, "confidence": 1.0} for token in tokens],
+                },
+            }
+        )
+
+    async for msg in ws:
+        if msg.type == WSMsgType.TEXT:
+            data = json.loads(msg.data)
+            if "config" in data:
+                config = data["config"]
+                # 16-bit mono PCM
+                byte_rate = config.get("sample_rate", 8000) * 2
+                continue
+            if data.get("eof"):
+                await asyncio.sleep(options.finalize_delay)
+                await ws.send_str(
+                    response(
+                        f"segment {segment_id} {config['model']}", "complete", True
+                    )
+                )
+                break
+
+        elif msg.type == WSMsgType.BINARY:
+            if config is None:
+                await ws.send_str(
+                    error_message("config_missing", "Send the config first", 400)
+                )
+                break
+
+            received += len(msg.data)
+            if received - segment_start >= options.segment_seconds * byte_rate:
+                await ws.send_str(
+                    response(f"segment {segment_id} {config['model']}", "complete")
+                )
+                segment_id += 1
+                segment_start = received
+                last_partial = received
+            elif received - last_partial >= PARTIAL_SECONDS * byte_rate:
+                if not config.get("exclude_partial"):
+                    await ws.send_str(response(f"segment {segment_id}", "partial"))
+                last_partial = received
+
+        elif msg.type == WSMsgType.ERROR:
+            break
+
+    await ws.close()
+    return ws
+
+
+async def transcribe_handler(request):
+    options = request.app["options"]
+    form = await request.post()
+    audio_file = form["audio_file"]
+
+    with wave.open(io.BytesIO(audio_file.file.read()), "rb") as wf:
+        duration = wf.getnframes() / wf.getframerate()
+
+    await asyncio.sleep(duration * options.processing_rtf)
+    return web.json_response(
+        {
+            "call_id": str(uuid.uuid4()),
+            "text": f"transcript of {audio_file.filename} {form['model']}",
+        }
+    )
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_subprocess(*options):
+    """
+    Runs the mock server in its own process, so it does not compete with
+    the client being measured for the event loop, on a free port.
+
+    Returns:
+    - tuple: (subprocess.Popen, port)
+    """
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--port", str(port), *options],
+        stdout=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.1)
+
+    server.kill()
+    raise RuntimeError("Mock server did not start")
+
+
+def create_app(options):
+    app = web.Application(client_max_size=1024**3)
+    app["options"] = options
+    app["state"] = {"active_sessions": 0}
+    app.router.add_get("/", streaming_handler)
+    app.router.add_post("/api/transcribe", transcribe_handler)
+    return app
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Local mock of the Bodhi streaming and non-streaming endpoints",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=8080, help="Bind port")
+    parser.add_argument(
+        "--segment-seconds",
+        type=float,
+        default=2.0,
+        help="Seconds of audio per complete segment",
+    )
+    parser.add_argument(
+        "--finalize-delay",
+        type=float,
+        default=0.05,
+        help="Seconds between receiving EOF and sending the final transcript",
+    )
+    parser.add_argument(
+        "--processing-rtf",
+        type=float,
+        default=0.05,
+        help="Non-streaming processing time as a fraction of the audio duration",
+    )
+    parser.add_argument(
+        "--stamp",
+        action="store_true",
+        help="Append the send time to every transcript text",
+    )
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=0,
+        help="Reject handshakes with 429 above this many concurrent sessions (0: no limit)",
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = get_args()
+    web.run_app(create_app(args), host=args.host, port=args.port)
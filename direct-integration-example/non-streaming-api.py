@@ -3,27 +3,30 @@ import requests
 import uuid
 import argparse
 
+from transcript_sink import create_sink, final_row
+
 # Ensure API_KEY and CUSTOMER_ID are set as global variables
 API_KEY = os.getenv("API_KEY")
 CUSTOMER_ID = os.getenv("CUSTOMER_ID")
 
 
 # Function to transcribe audio using Bodhi API
-def transcribe_audio(audio_file_path, model):
+def transcribe_audio(
+    audio_file_path, model, url="https://bodhi.navana.ai/api/transcribe", verbose=True
+):
     """
     Transcribes audio file using Bodhi API.
 
     Parameters:
     - audio_file_path (str): Path to the audio file to transcribe.
     - model (str): Model name for transcription.
+    - url (str): Bodhi API endpoint URL.
+    - verbose (bool): Print the received transcript.
 
     Returns:
-    - str: Response text from the API.
+    - dict: Parsed API response, or None if the request failed.
     """
 
-    # Bodhi API endpoint URL
-    URL = "https://bodhi.navana.ai/api/transcribe"
-
     # Generate unique transaction ID
     transaction_id = str(uuid.uuid4())
 
@@ -50,13 +53,15 @@ def transcribe_audio(audio_file_path, model):
 
     try:
         # Send POST request to Bodhi API
-        response = requests.post(URL, headers=headers, data=payload, files=files)
+        response = requests.post(url, headers=headers, data=payload, files=files)
         response.raise_for_status()
 
         # Parse JSON string
         data = response.json()
 
-        print(f"Received data: Call_id={data['call_id']}, Text={data['text']}")
+        if verbose:
+            print(f"Received data: Call_id={data['call_id']}, Text={data['text']}")
+        return data
 
     except requests.exceptions.RequestException as e:
         if e.response is not None and e.response.status_code in [400, 401, 402, 403]:
@@ -101,6 +106,11 @@ if __name__ == "__main__":
         ],
         help="Model name for transcription (default: hi-general-v2-8khz)",
     )
+    parser.add_argument(
+        "--sink",
+        dest="sink",
+        help="Store the transcript in a SQLite database, or in a Parquet file if the path ends in .parquet",
+    )
 
     args = parser.parse_args()
 
@@ -115,7 +125,12 @@ if __name__ == "__main__":
         model = args.model
 
         # Call transcribe_audio function with the audio file
-        transcribe_audio(audio_file_path, model)
+        data = transcribe_audio(audio_file_path, model)
+
+        if args.sink and data is not None:
+            sink = create_sink(args.sink)
+            sink.add(final_row(data["call_id"], data["text"], model, audio_file_path))
+            sink.close()
 
     except ValueError as e:
         print(e)
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+import uuid
+import wave
+
+import mock_server
+
+try:
+    from bodhi import BodhiClient, LiveTranscriptionEvents, TranscriptionConfig
+except ImportError:
+    BodhiClient = None
+from streaming import REALTIME_RESOLUTION, chunk_pcm, create_session, stream_pcm
+
+PATHS = ["sdk", "direct"]
+
+
+def max_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def dispatch_latency(text, latencies):
+    """
+    The mock server is started with --stamp and appends the time each
+    message was sent; the difference to now is the time the message spent
+    in the socket, the client library and its callback dispatch.
+    """
+    received = time.time()
+    _, _, stamp = text.rpartition("@")
+    if stamp:
+        latencies.append(received - float(stamp))
+
+
+async def sdk_session(uri, chunks, sample_rate, latencies):
+    # Same flow as python-sdk-examples/streaming_transcription.py. A
+    # BodhiClient holds the state of one session, so every session gets its
+    # own client.
+    client = BodhiClient(api_key="benchmark", customer_id=str(uuid.uuid4()), uri=uri)
+    finished = asyncio.Event()
+    failed = []
+
+    async def on_transcript(response):
+        dispatch_latency(response.text, latencies)
+        if response.eos:
+            finished.set()
+
+    async def on_error(e):
+        failed.append(e)
+
+    client.on(LiveTranscriptionEvents.Transcript, on_transcript)
+    client.on(LiveTranscriptionEvents.Error, on_error)
+
+    try:
+        await client.start_connection(
+            config=TranscriptionConfig(
+                model="hi-banking-v2-8khz", sample_rate=sample_rate
+            )
+        )
+        for chunk in chunks:
+            await client.send_audio_stream(chunk)
+            await asyncio.sleep(REALTIME_RESOLUTION)
+        # close_connection sends EOF and waits for the end of the transcript
+        await client.close_connection()
+    except Exception as e:
+        failed.append(e)
+
+    return finished.is_set() and not failed
+
+
+async def direct_session(session, uri, chunks, sample_rate, latencies):
+    complete_sentences = await stream_pcm(
+        session,
+        uri,
+        chunks,
+        sample_rate,
+        verbose=False,
+        on_response=lambda response: dispatch_latency(response["text"], latencies),
+    )
+    return complete_sentences is not None
+
+
+async def run_worker(path, uri, chunks, sample_rate, sessions):
+    latencies = []
+    baseline_rss = max_rss_kb()
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+
+    if path == "sdk":
+        # The SDK logs every connection at INFO level to stdout
+        logging.getLogger("bodhi").setLevel(logging.WARNING)
+        results = await asyncio.gather(
+            *(sdk_session(uri, chunks, sample_rate, latencies) for _ in range(sessions))
+        )
+    else:
+        async with create_session("benchmark", "benchmark", uri) as session:
+            results = await asyncio.gather(
+                *(
+                    direct_session(session, uri, chunks, sample_rate, latencies)
+                    for _ in range(sessions)
+                )
+            )
+
+    latencies.sort()
+    return {
+        "failed": results.count(False),
+        "wall": time.monotonic() - wall_start,
+        "cpu": time.process_time() - cpu_start,
+        "rss_kb": max_rss_kb() - baseline_rss,
+        "messages": len(latencies),
+        "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "latency_p99": latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+    }
+
+
+def load_chunks(filepath, seconds, path="direct"):
+    with wave.open(filepath, "rb") as wf:
+        channels, sample_width, sample_rate, num_samples, _, _ = wf.getparams()
+        byte_rate = sample_rate * sample_width * channels
+        data = wf.readframes(min(num_samples, int(seconds * sample_rate)))
+    chunks = chunk_pcm(data, byte_rate)
+    if path == "sdk":
+        # The SDK expects bytes. Converted before the baselines are taken,
+        # so the copy is not charged to the SDK's CPU time and memory.
+        chunks = [bytes(chunk) for chunk in chunks]
+    return chunks, sample_rate, len(data) / byte_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the per-session cost of the bodhi SDK and the direct aiohttp client",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-f",
+        "--file",
+        type=str,
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "..", "loan.wav"
+        ),
+        help="wave/audio file streamed by every session",
+    )
+    parser.add_argument(
+        "--seconds",
+        type=float,
+        default=10,
+        help="Seconds of the file to stream per session",
+    )
+    parser.add_argument(
+        "-n",
+        "--sessions",
+        type=int,
+        nargs="+",
+        default=[1, 10, 50, 100],
+        help="Concurrent session counts to benchmark",
+    )
+    parser.add_argument(
+        "--paths", nargs="+", choices=PATHS, default=PATHS, help="Clients to compare"
+    )
+    # Internal: run a single measurement in this process and print it as JSON
+    parser.add_argument("--worker", choices=PATHS, help=argparse.SUPPRESS)
+    parser.add_argument("--uri", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Workers are not passed --paths, only the path they measure
+    needs_sdk = args.worker == "sdk" if args.worker else "sdk" in args.paths
+    if needs_sdk and BodhiClient is None:
+        # stderr, so the parent shows it when a worker fails
+        print("Please install the bodhi SDK first. You can use", file=sys.stderr)
+        print(file=sys.stderr)
+        print("  pip install bodhi-sdk", file=sys.stderr)
+        print(file=sys.stderr)
+        sys.exit(-1)
+
+    if args.worker:
+        chunks, sample_rate, _ = load_chunks(args.file, args.seconds, args.worker)
+        result = asyncio.run(
+            run_worker(args.worker, args.uri, chunks, sample_rate, args.sessions[0])
+        )
+        print(json.dumps(result))
+        return
+
+    _, _, audio_seconds = load_chunks(args.file, args.seconds)
+    server, port = mock_server.start_subprocess("--stamp")
+    uri = f"ws://127.0.0.1:{port}/"
+
+    print(
+        f"{'Path':<8}{'Sessions':>9}{'Failed':>8}{'Wall':>8}"
+        f"{'CPU/audio s':>13}{'Memory/session':>16}"
+        f"{'Dispatch p50':>14}{'Dispatch p99':>14}"
+    )
+    try:
+        for sessions in args.sessions:
+            for path in args.paths:
+                # Every measurement runs in a fresh process so CPU time and
+                # peak memory are not skewed by earlier runs
+                worker = subprocess.run(
+                    [
+                        sys.executable,
+                        os.path.abspath(__file__),
+                        "--worker",
+                        path,
+                        "--uri",
+                        uri,
+                        "-f",
+                        args.file,
+                        "--seconds",
+                        str(args.seconds),
+                        "-n",
+                        str(sessions),
+                    ],
+                    capture_output=True,
+                    text=True,
+                )
+                if worker.returncode != 0:
+                    print(f"{path} worker failed:\n{worker.stderr}", file=sys.stderr)
+                    continue
+
+                r = json.loads(worker.stdout.strip().splitlines()[-1])
+                print(
+                    f"{path:<8}{sessions:>9}{r['failed']:>8}{r['wall']:>7.2f}s"
+                    f"{r['cpu'] / (sessions * audio_seconds) * 1000:>10.3f} ms"
+                    f"{r['rss_kb'] / sessions:>13.1f} KB"
+                    f"{r['latency_p50'] * 1000:>11.2f} ms"
+                    f"{r['latency_p99'] * 1000:>11.2f} ms"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,10 +22,13 @@ except ImportError:
 import aiohttp
 from aiohttp import WSMsgType
 
+from loop_monitor import LoopMonitor, loop_arguments, use_uvloop
+
 
 def get_args():
     parser = argparse.ArgumentParser(
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        parents=[loop_arguments()],
     )
 
     parser.add_argument(
@@ -235,6 +238,11 @@ async def main():
 
     signal.signal(signal.SIGINT, signal_handler)
 
+    monitor = None
+    if args.monitor_loop:
+        monitor = LoopMonitor(slow_callback=args.slow_callback_ms / 1000)
+        monitor.start()
+
     try:
         await run(
             server_addr=server_addr,
@@ -245,9 +253,17 @@ async def main():
 
     except asyncio.CancelledError:
         print("Main task cancelled")
+    finally:
+        if monitor is not None:
+            await monitor.stop()
+            print(monitor.report(), file=sys.stderr)
 
 
 if __name__ == "__main__":
+    loop_args, _ = loop_arguments().parse_known_args()
+    if loop_args.uvloop:
+        use_uvloop()
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -6,9 +6,41 @@ import json
 import os
 import uuid
 import ssl
+import time
 import argparse
+import contextlib
+import csv
+
+from admission import AdmissionClosed, admission_arguments, create_admission
+from audio_corpus import AudioCorpus
+from loop_monitor import LoopMonitor, loop_arguments, use_uvloop
+from transcript_sink import create_sink, session_recorder
 
 EOF_MESSAGE = '{"eof": 1}'
+REALTIME_RESOLUTION = 0.02  # 20ms
+DEFAULT_MODEL = "hi-banking-v2-8khz"
+# Written in place of the transcript of a failed session
+FAILED = "<failed>"
+MODELS = [
+    "hi-general-v2-8khz",
+    "hi-banking-v2-8khz",
+    "kn-general-v2-8khz",
+    "kn-banking-v2-8khz",
+    "mr-general-v2-8khz",
+    "mr-banking-v2-8khz",
+    "ta-general-v2-8khz",
+    "ta-banking-v2-8khz",
+    "bn-general-v2-8khz",
+    "bn-banking-v2-8khz",
+    "en-general-v2-8khz",
+    "en-banking-v2-8khz",
+    "gu-general-v2-8khz",
+    "gu-banking-v2-8khz",
+    "te-general-v2-8khz",
+    "te-banking-v2-8khz",
+    "ml-general-v2-8khz",
+    "ml-banking-v2-8khz",
+]
 
 ssl_context = ssl.create_default_context()
 ssl_context.check_hostname = False
@@ -23,7 +55,17 @@ def int_or_str(text):
         return text
 
 
-async def receive_transcription(ws):
+async def receive_transcription(
+    ws, verbose=True, admission=None, on_response=None, progress=None
+):
+    """
+    If a progress dict is given, "responded" is set in it once a transcript
+    arrives and "overload" when the server reports overload.
+
+    Returns:
+    - list: Complete sentences, or None if the session ended without the
+      final (eos) transcript.
+    """
     complete_sentences = []
     async for msg in ws:
         if msg.type == aiohttp.WSMsgType.TEXT:
@@ -38,6 +80,11 @@ async def receive_transcription(ws):
                         f"Server Error: Type={response_data.get('error')}, Message={response_data.get('message')}, Code={response_data.get('code')}, Timestamp={response_data.get('timestamp')}",
                         file=sys.stderr,
                     )
+                    overload = admission is not None and admission.on_server_error(
+                        response_data
+                    )
+                    if progress is not None:
+                        progress["overload"] = overload
                     break
 
                 call_id = response_data.get("call_id")
@@ -49,17 +96,25 @@ async def receive_transcription(ws):
                 if transcript_type == "complete" and transcript_text != "":
                     complete_sentences.append(transcript_text)
 
-                print(
-                    f"Received data: Call_id={call_id}, "
-                    f"Segment_id={segment_id}, "
-                    f"EOS={end_of_stream}, "
-                    f"Type={transcript_type}, "
-                    f"Text={transcript_text}"
-                )
+                if progress is not None:
+                    progress["responded"] = True
+
+                if on_response is not None:
+                    on_response(response_data)
+
+                if verbose:
+                    print(
+                        f"Received data: Call_id={call_id}, "
+                        f"Segment_id={segment_id}, "
+                        f"EOS={end_of_stream}, "
+                        f"Type={transcript_type}, "
+                        f"Text={transcript_text}"
+                    )
 
                 if end_of_stream:
-                    print("Complete transcript: ", ", ".join(complete_sentences))
-                    break
+                    if verbose:
+                        print("Complete transcript: ", ", ".join(complete_sentences))
+                    return complete_sentences
 
             except json.JSONDecodeError:
                 print(f"Received a non-JSON response: {msg.data}")
@@ -70,89 +125,329 @@ async def receive_transcription(ws):
         elif msg.type == aiohttp.WSMsgType.CLOSED:
             break
 
+    # Server error, websocket error or the connection closed early
+    return None
 
-async def send_audio(ws, wf, sample_rate):
-    REALTIME_RESOLUTION = 0.02  # 20ms
-    byte_rate = sample_rate * wf.getsampwidth() * wf.getnchannels()
 
-    data = wf.readframes(wf.getnframes())
+def chunk_pcm(data, byte_rate):
+    chunk_size = int(byte_rate * REALTIME_RESOLUTION)
+
+    # Slicing a memoryview does not copy, so large buffers and mmap-backed
+    # corpus entries are chunked without duplicating the audio. The returned
+    # chunks can be shared by any number of sessions.
+    data = memoryview(data)
+    return [
+        data[offset : offset + chunk_size] for offset in range(0, len(data), chunk_size)
+    ]
 
-    while len(data):
-        chunk_size = int(byte_rate * REALTIME_RESOLUTION)
-        chunk, data = data[:chunk_size], data[chunk_size:]
+
+async def send_chunks(ws, chunks, progress=None):
+    for chunk in chunks:
         await ws.send_bytes(chunk)
+        if progress is not None:
+            progress["audio_sent"] = True
         await asyncio.sleep(REALTIME_RESOLUTION)
 
     # Send EOF JSON message
     await ws.send_str(EOF_MESSAGE)
+    return time.monotonic()
+
+
+async def send_audio(ws, wf, sample_rate):
+    byte_rate = sample_rate * wf.getsampwidth() * wf.getnchannels()
+    await send_chunks(ws, chunk_pcm(wf.readframes(wf.getnframes()), byte_rate))
 
 
-async def run_test(api_key, customer_id, uri, filepath):
+def create_session(api_key, customer_id, uri):
     request_headers = {
         "x-api-key": api_key,
         "x-customer-id": customer_id,
     }
+    # No per-host connection limit, concurrency is bounded by the callers
     connector = aiohttp.TCPConnector(
-        ssl=ssl_context if uri.startswith("wss://") else None
+        ssl=ssl_context if uri.startswith("wss://") else None, limit=0
     )
 
-    async with aiohttp.ClientSession(
-        connector=connector, headers=request_headers
-    ) as session:
+    return aiohttp.ClientSession(connector=connector, headers=request_headers)
+
+
+async def stream_pcm(
+    session,
+    uri,
+    chunks,
+    sample_rate,
+    model=DEFAULT_MODEL,
+    timings=None,
+    verbose=True,
+    admission=None,
+    on_response=None,
+):
+    """
+    Streams pre-chunked audio over one session. If a timings dict is given,
+    the time between sending EOF and the end of the transcript is stored in
+    it as "finalization_latency" (seconds).
+
+    With an AdmissionController the session waits for admission before
+    connecting, reports handshake results and server errors to it, and is
+    retried when the server signals overload, so that on_response never
+    sees the same audio twice:
+    - after an overload error message, only if no transcript arrived yet;
+      the server has ended the session without transcribing the audio.
+    - after a connection error, only if no audio or transcript has been
+      exchanged yet, since the server may have transcribed part of it.
+
+    on_response, if given, is called with every transcript message.
+
+    Returns:
+    - list: Complete sentences, or None if the session failed.
+    """
+    attempts = 1 if admission is None else admission.max_retries + 1
+    audio_seconds = len(chunks) * REALTIME_RESOLUTION
+
+    for attempt in range(attempts):
+        if attempt:
+            print(f"Retrying session, attempt {attempt + 1}", file=sys.stderr)
+        progress = {}
         try:
-            async with session.ws_connect(uri) as ws:
-                wf = wave.open(filepath, "rb")
-                channels, sample_width, sample_rate, num_samples, _, _ = wf.getparams()
-                print(
-                    f"Channels = {channels}, Sample Rate = {sample_rate} Hz, Sample width = {sample_width} bytes",
-                    file=sys.stderr,
-                )
-
-                # Send initial config
-                config_msg = json.dumps(
-                    {
-                        "config": {
-                            "sample_rate": sample_rate,
-                            "transaction_id": str(uuid.uuid4()),
-                            "model": "hi-banking-v2-8khz",
-                            # Change the model based on your preference
-                            # Kannada - kn-banking-v2-8khz
-                            # Hindi - hi-banking-v2-8khz
-                            # Marathi - mr-banking-v2-8khz
-                            # Tamil - ta-banking-v2-8khz
-                            # Bengali - bn-banking-v2-8khz
-                            # English - en-banking-v2-8khz
-                            # Gujarati - gu-banking-v2-8khz
-                            # Malayalam - ml-banking-v2-8khz
+            async with (
+                admission.admit(audio_seconds)
+                if admission is not None
+                else contextlib.nullcontext()
+            ):
+                async with session.ws_connect(uri) as ws:
+                    if admission is not None:
+                        admission.on_success()
+
+                    # Send initial config
+                    config_msg = json.dumps(
+                        {
+                            "config": {
+                                "sample_rate": sample_rate,
+                                "transaction_id": str(uuid.uuid4()),
+                                "model": model,
+                                # Change the model based on your preference (-m)
+                                # Kannada - kn-banking-v2-8khz
+                                # Hindi - hi-banking-v2-8khz
+                                # Marathi - mr-banking-v2-8khz
+                                # Tamil - ta-banking-v2-8khz
+                                # Bengali - bn-banking-v2-8khz
+                                # English - en-banking-v2-8khz
+                                # Gujarati - gu-banking-v2-8khz
+                                # Malayalam - ml-banking-v2-8khz
+                            }
                         }
-                    }
-                )
-                await ws.send_str(config_msg)
-
-                send_task = asyncio.create_task(send_audio(ws, wf, sample_rate))
-                recv_task = asyncio.create_task(receive_transcription(ws))
+                    )
+                    await ws.send_str(config_msg)
 
-                await asyncio.gather(send_task, recv_task)
+                    send_task = asyncio.create_task(send_chunks(ws, chunks, progress))
+                    recv_task = asyncio.create_task(
+                        receive_transcription(
+                            ws, verbose, admission, on_response, progress
+                        )
+                    )
 
+                    complete_sentences = await recv_task
+                    if complete_sentences is None:
+                        # Stop streaming the rest of the audio
+                        send_task.cancel()
+                        with contextlib.suppress(
+                            asyncio.CancelledError, aiohttp.ClientError, ConnectionError
+                        ):
+                            await send_task
+                        if progress.get("overload") and not progress.get("responded"):
+                            continue
+                        return None
+
+                    eof_sent = await send_task
+                    if timings is not None:
+                        timings["finalization_latency"] = time.monotonic() - eof_sent
+                    return complete_sentences
+
+        except AdmissionClosed:
+            return None
         except aiohttp.WSServerHandshakeError as e:
             print(
                 f"WebSocket handshake failed with status code: {e.status}",
                 file=sys.stderr,
             )
+            if admission is not None:
+                if admission.on_handshake_error(e.status):
+                    continue
+                return None
             if e.status == 401:
                 print("Invalid API key or customer ID.", file=sys.stderr)
             elif e.status == 402:
                 print("Insufficient balance.", file=sys.stderr)
             elif e.status == 403:
                 print("Customer has been deactivated", file=sys.stderr)
+            return None
         except aiohttp.ClientConnectionError as e:
             print(f"Connection error: {str(e)}", file=sys.stderr)
+            if admission is not None:
+                admission.on_overload("connection error")
+                if not (progress.get("audio_sent") or progress.get("responded")):
+                    continue
+            return None
         except Exception as e:
             print(f"An error occurred: {str(e)}", file=sys.stderr)
             import traceback
 
             print("Full error traceback:", file=sys.stderr)
             print(traceback.format_exc(), file=sys.stderr)
+            return None
+
+
+async def compare_models(
+    session,
+    uri,
+    data,
+    sample_rate,
+    byte_rate,
+    models,
+    admission=None,
+    sink=None,
+    source=None,
+):
+    """
+    Feeds one decoded audio buffer to a concurrent session per model. The
+    audio is chunked once and the same chunks are sent on every session.
+    With a TranscriptSink, complete segments and final transcripts are
+    stored with the model and source they belong to.
+
+    Returns:
+    - dict: Complete transcript per model (None if its session failed).
+    """
+    chunks = chunk_pcm(data, byte_rate)
+    results = await asyncio.gather(
+        *(
+            stream_pcm(
+                session,
+                uri,
+                chunks,
+                sample_rate,
+                model,
+                admission=admission,
+                on_response=(
+                    None if sink is None else session_recorder(sink, model, source)
+                ),
+            )
+            for model in models
+        )
+    )
+    return {
+        model: None if sentences is None else ", ".join(sentences)
+        for model, sentences in zip(models, results)
+    }
+
+
+def open_results(output, models):
+    if output is None:
+        return None, None
+    results_file = open(output, "w", newline="")
+    writer = csv.writer(results_file)
+    writer.writerow(["file"] + models)
+    return results_file, writer
+
+
+def report_results(name, transcripts, writer):
+    # A failed session must not look like an empty transcript
+    transcripts = {
+        model: FAILED if transcript is None else transcript
+        for model, transcript in transcripts.items()
+    }
+    if len(transcripts) > 1:
+        for model, transcript in transcripts.items():
+            print(f"Model={model}, File={name}, Text={transcript}")
+    if writer is not None:
+        writer.writerow([name] + list(transcripts.values()))
+
+
+async def run_test(
+    api_key,
+    customer_id,
+    uri,
+    filepath,
+    models,
+    output=None,
+    admission=None,
+    sink=None,
+):
+    with wave.open(filepath, "rb") as wf:
+        channels, sample_width, sample_rate, num_samples, _, _ = wf.getparams()
+        print(
+            f"Channels = {channels}, Sample Rate = {sample_rate} Hz, Sample width = {sample_width} bytes",
+            file=sys.stderr,
+        )
+        data = wf.readframes(num_samples)
+
+    byte_rate = sample_rate * sample_width * channels
+    results_file, writer = open_results(output, models)
+
+    try:
+        async with create_session(api_key, customer_id, uri) as session:
+            transcripts = await compare_models(
+                session,
+                uri,
+                data,
+                sample_rate,
+                byte_rate,
+                models,
+                admission,
+                sink,
+                filepath,
+            )
+        report_results(filepath, transcripts, writer)
+    finally:
+        if results_file is not None:
+            results_file.close()
+
+
+async def run_corpus(
+    api_key,
+    customer_id,
+    uri,
+    corpus_path,
+    concurrency,
+    models,
+    output=None,
+    admission=None,
+    sink=None,
+):
+    results_file, writer = open_results(output, models)
+
+    with AudioCorpus(corpus_path) as corpus:
+        print(f"Streaming {len(corpus)} files from {corpus_path}", file=sys.stderr)
+        # Workers share one iterator so only `concurrency` files are in flight
+        entries = iter(corpus)
+
+        async def worker(session):
+            for entry in entries:
+                if admission is not None and admission.closed_reason is not None:
+                    break
+                print(f"Streaming {entry['name']}", file=sys.stderr)
+                byte_rate = (
+                    entry["sample_rate"] * entry["sample_width"] * entry["channels"]
+                )
+                with corpus.read(entry) as data:
+                    transcripts = await compare_models(
+                        session,
+                        uri,
+                        data,
+                        entry["sample_rate"],
+                        byte_rate,
+                        models,
+                        admission,
+                        sink,
+                        entry["name"],
+                    )
+                report_results(entry["name"], transcripts, writer)
+
+        try:
+            async with create_session(api_key, customer_id, uri) as session:
+                await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        finally:
+            if results_file is not None:
+                results_file.close()
 
 
 async def main():
@@ -166,12 +461,12 @@ async def main():
         print("Please set API key and customer ID in environment variables.")
         return
 
-    parser = argparse.ArgumentParser(add_help=False)
+    parser = loop_arguments()
     args, remaining = parser.parse_known_args()
     parser = argparse.ArgumentParser(
         description="ASR Server",
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        parents=[parser],
+        parents=[parser, admission_arguments()],
     )
     parser.add_argument(
         "-u",
@@ -182,11 +477,92 @@ async def main():
         default="wss://bodhi.navana.ai",
     )
     parser.add_argument("-f", "--file", type=str, help="wave/audio file path")
+    parser.add_argument(
+        "-c",
+        "--corpus",
+        type=str,
+        help="packed corpus file created with audio_corpus.py, streams every entry",
+    )
+    parser.add_argument(
+        "-n",
+        "--concurrency",
+        type=int,
+        default=1,
+        help="number of corpus files in flight at the same time; each file opens one session per -m model",
+    )
+    parser.add_argument(
+        "-m",
+        "--model",
+        dest="models",
+        action="append",
+        choices=MODELS,
+        help=f"model to transcribe with, repeat to compare several models on the same audio (default: {DEFAULT_MODEL})",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help="CSV file with the complete transcript of every model side by side",
+    )
+    parser.add_argument(
+        "--sink",
+        type=str,
+        help="store complete segments and final transcripts in a SQLite database, or in a Parquet file if the path ends in .parquet",
+    )
 
-    args = parser.parse_args(remaining)
+    args = parser.parse_args(remaining, namespace=args)
+    models = args.models or [DEFAULT_MODEL]
 
-    if args.file:
-        await run_test(api_key, customer_id, args.uri, args.file)
+    monitor = None
+    if args.monitor_loop:
+        monitor = LoopMonitor(slow_callback=args.slow_callback_ms / 1000)
+        monitor.start()
+
+    try:
+        await dispatch(api_key, customer_id, args, models)
+    finally:
+        if monitor is not None:
+            await monitor.stop()
+            print(monitor.report(), file=sys.stderr)
+
+
+async def dispatch(api_key, customer_id, args, models):
+    # One controller for every session of this process
+    admission = create_admission(args)
+    sink = None if args.sink is None else create_sink(args.sink)
+
+    try:
+        await run_selected(api_key, customer_id, args, models, admission, sink)
+    finally:
+        if sink is not None:
+            # Writes the last batch, off the event loop
+            await asyncio.to_thread(sink.close)
+
+
+async def run_selected(api_key, customer_id, args, models, admission, sink):
+    if args.corpus:
+        await run_corpus(
+            api_key,
+            customer_id,
+            args.uri,
+            args.corpus,
+            args.concurrency,
+            models,
+            args.output,
+            admission,
+            sink,
+        )
+    elif args.file:
+        await run_test(
+            api_key,
+            customer_id,
+            args.uri,
+            args.file,
+            models,
+            args.output,
+            admission,
+            sink,
+        )
     else:
         print(
             "This script is meant to show how to connect to Navana Streaming Speech Recognition API endpoint through websockets\n"
@@ -199,4 +575,7 @@ async def main():
 
 
 if __name__ == "__main__":
+    loop_args, _ = loop_arguments().parse_known_args()
+    if loop_args.uvloop:
+        use_uvloop()
     asyncio.run(main())
@@ -0,0 +1,438 @@
+import aiohttp
+import asyncio
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+import uuid
+import wave
+
+from aiohttp import web, WSMsgType
+
+from streaming import EOF_MESSAGE, send_audio, ssl_context
+
+DROP_POLICIES = ["drop-oldest", "drop-newest", "disconnect"]
+
+
+class Subscriber:
+    """
+    A single reader of a call's transcript, backed by a bounded queue.
+
+    When the queue is full the drop policy decides what happens:
+    - drop-oldest: discard the oldest queued message to make room
+    - drop-newest: discard the incoming message
+    - disconnect: drop everything queued and end the subscription
+    """
+
+    def __init__(self, maxsize, drop_policy):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, message):
+        if self.closed:
+            return
+
+        if self.queue.full():
+            self.dropped += 1
+            if self.drop_policy == "drop-newest":
+                return
+            if self.drop_policy == "disconnect":
+                self.dropped += self.queue.qsize()
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.close()
+                return
+            self.queue.get_nowait()
+
+        self.queue.put_nowait(message)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # Make room for the sentinel so the reader always wakes up
+        while self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class TranscriptHub:
+    """
+    Fans out transcript messages of each upstream call_id to any number of
+    local subscribers. Subscribing to a call_id that has not produced any
+    message yet is allowed; late subscribers first receive the complete
+    segments seen so far.
+    """
+
+    def __init__(self, queue_size=100, drop_policy="drop-oldest", history=1024):
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.subscribers = collections.defaultdict(set)
+        self.active = set()
+        self.complete_segments = collections.defaultdict(list)
+        self.finished = collections.deque(maxlen=history)
+
+    def subscribe(self, call_id):
+        backlog = self.complete_segments.get(call_id, [])
+        # The queue has room for the replayed segments on top of its live
+        # capacity, so the replay is never subject to the drop policy
+        subscriber = Subscriber(self.queue_size + len(backlog), self.drop_policy)
+        for message in backlog:
+            subscriber.queue.put_nowait(message)
+        self.subscribers[call_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, call_id, subscriber):
+        subscribers = self.subscribers.get(call_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers and call_id not in self.complete_segments:
+                del self.subscribers[call_id]
+        if subscriber.dropped:
+            print(
+                f"Subscriber of Call_id={call_id} dropped {subscriber.dropped} messages",
+                file=sys.stderr,
+            )
+
+    def publish(self, call_id, message):
+        self.active.add(call_id)
+        if message.get("type") == "complete" and message.get("text") != "":
+            self.complete_segments[call_id].append(message)
+        for subscriber in list(self.subscribers[call_id]):
+            subscriber.offer(message)
+
+    def close(self, call_id):
+        for subscriber in self.subscribers.pop(call_id, set()):
+            subscriber.close()
+        self.complete_segments.pop(call_id, None)
+        self.active.discard(call_id)
+        self.finished.append(call_id)
+
+    def started(self, call_id):
+        return call_id in self.active
+
+    def calls(self):
+        return {
+            call_id: len(subscribers)
+            for call_id, subscribers in self.subscribers.items()
+        }
+
+
+async def receive_transcription(ws, hub, client_ws=None):
+    """
+    Reads transcripts from the upstream Bodhi session and publishes every
+    message to the hub. If client_ws is given, messages are also forwarded
+    to the client that is producing the audio.
+    """
+    call_id = None
+    try:
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                if client_ws is not None and not client_ws.closed:
+                    await client_ws.send_str(msg.data)
+
+                try:
+                    response_data = json.loads(msg.data)
+                except json.JSONDecodeError:
+                    print(f"Received a non-JSON response: {msg.data}")
+                    continue
+
+                error = response_data.get("error")
+                if error is not None:
+                    print(
+                        f"Server Error: Type={response_data.get('error')}, Message={response_data.get('message')}, Code={response_data.get('code')}, Timestamp={response_data.get('timestamp')}",
+                        file=sys.stderr,
+                    )
+                    break
+
+                call_id = response_data.get("call_id", call_id)
+                hub.publish(call_id, response_data)
+
+                if response_data.get("eos", False):
+                    break
+
+            elif msg.type == aiohttp.WSMsgType.ERROR:
+                print(f"WebSocket error: {ws.exception()}")
+                break
+            elif msg.type == aiohttp.WSMsgType.CLOSED:
+                break
+    finally:
+        if call_id is not None:
+            hub.close(call_id)
+
+
+async def relay_file(app, filepath, model):
+    try:
+        async with app["session"].ws_connect(app["uri"]) as ws:
+            with wave.open(filepath, "rb") as wf:
+                sample_rate = wf.getframerate()
+                await ws.send_str(
+                    json.dumps(
+                        {
+                            "config": {
+                                "sample_rate": sample_rate,
+                                "transaction_id": str(uuid.uuid4()),
+                                "model": model,
+                            }
+                        }
+                    )
+                )
+
+                send_task = asyncio.create_task(send_audio(ws, wf, sample_rate))
+                recv_task = asyncio.create_task(receive_transcription(ws, app["hub"]))
+
+                await asyncio.gather(send_task, recv_task)
+
+    except aiohttp.WSServerHandshakeError as e:
+        print(
+            f"WebSocket handshake failed with status code: {e.status}",
+            file=sys.stderr,
+        )
+    except aiohttp.ClientConnectionError as e:
+        print(f"Connection error: {str(e)}", file=sys.stderr)
+
+
+async def ingest_handler(request):
+    """
+    Accepts the same protocol as the Bodhi endpoint (config message, binary
+    audio, eof message) and proxies it to one upstream session. Transcripts
+    are returned to the caller and published to the hub.
+    """
+    client_ws = web.WebSocketResponse()
+    await client_ws.prepare(request)
+
+    app = request.app
+
+    async def forward_audio(upstream):
+        async for msg in client_ws:
+            if msg.type == WSMsgType.BINARY:
+                await upstream.send_bytes(msg.data)
+            elif msg.type == WSMsgType.TEXT:
+                await upstream.send_str(msg.data)
+            elif msg.type == WSMsgType.ERROR:
+                break
+        # The audio producer went away, make sure the upstream finalizes
+        if not upstream.closed:
+            await upstream.send_str(EOF_MESSAGE)
+
+    try:
+        async with app["session"].ws_connect(app["uri"]) as upstream:
+            send_task = asyncio.create_task(forward_audio(upstream))
+            await receive_transcription(upstream, app["hub"], client_ws)
+            send_task.cancel()
+            try:
+                await send_task
+            except asyncio.CancelledError:
+                pass
+
+    except aiohttp.WSServerHandshakeError as e:
+        print(
+            f"WebSocket handshake failed with status code: {e.status}",
+            file=sys.stderr,
+        )
+        await client_ws.send_str(
+            json.dumps({"error": "handshake_failed", "code": e.status})
+        )
+    except aiohttp.ClientConnectionError as e:
+        print(f"Connection error: {str(e)}", file=sys.stderr)
+
+    await client_ws.close()
+    return client_ws
+
+
+def get_subscription(request):
+    hub = request.app["hub"]
+    call_id = request.match_info["call_id"]
+    if call_id in hub.finished:
+        raise web.HTTPGone(text=f"Call {call_id} has already finished")
+    return call_id, hub.subscribe(call_id)
+
+
+def not_started(request, call_id, subscribed_at):
+    # A call that never shows up (or finished so long ago that it is no
+    # longer remembered) must not hold a subscription forever
+    return (
+        not request.app["hub"].started(call_id)
+        and time.monotonic() - subscribed_at >= request.app["pending_timeout"]
+    )
+
+
+async def websocket_subscribe_handler(request):
+    call_id, subscriber = get_subscription(request)
+    subscribed_at = time.monotonic()
+    ws = web.WebSocketResponse(heartbeat=request.app["keepalive"])
+    await ws.prepare(request)
+
+    async def read_client():
+        # Subscribers only listen, but reading answers close frames and
+        # notices a client that went away while no transcript was due
+        async for _ in ws:
+            pass
+        subscriber.close()
+
+    reader = asyncio.create_task(read_client())
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    subscriber.get(), request.app["keepalive"]
+                )
+            except asyncio.TimeoutError:
+                if not_started(request, call_id, subscribed_at):
+                    break
+                continue
+            if message is None or ws.closed:
+                break
+            await ws.send_str(json.dumps(message))
+    except ConnectionResetError:
+        pass
+    finally:
+        reader.cancel()
+        request.app["hub"].unsubscribe(call_id, subscriber)
+        await ws.close()
+    return ws
+
+
+async def sse_subscribe_handler(request):
+    call_id, subscriber = get_subscription(request)
+    subscribed_at = time.monotonic()
+    response = web.StreamResponse(
+        headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+    )
+    await response.prepare(request)
+
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    subscriber.get(), request.app["keepalive"]
+                )
+            except asyncio.TimeoutError:
+                if not_started(request, call_id, subscribed_at):
+                    await response.write(b"event: end\ndata: {}\n\n")
+                    break
+                # Writing is the only way to notice a client that went away
+                await response.write(b": ping\n\n")
+                continue
+            if message is None:
+                await response.write(b"event: end\ndata: {}\n\n")
+                break
+            await response.write(f"data: {json.dumps(message)}\n\n".encode())
+    except ConnectionResetError:
+        pass
+    finally:
+        request.app["hub"].unsubscribe(call_id, subscriber)
+    return response
+
+
+async def calls_handler(request):
+    return web.json_response(request.app["hub"].calls())
+
+
+async def upstream_session(app):
+    connector = aiohttp.TCPConnector(
+        ssl=ssl_context if app["uri"].startswith("wss://") else None
+    )
+    app["session"] = aiohttp.ClientSession(
+        connector=connector, headers=app["request_headers"]
+    )
+    file_tasks = [
+        asyncio.create_task(relay_file(app, filepath, app["model"]))
+        for filepath in app["files"]
+    ]
+
+    yield
+
+    for task in file_tasks:
+        task.cancel()
+    await asyncio.gather(*file_tasks, return_exceptions=True)
+    await app["session"].close()
+
+
+def main():
+    # Fetch API key and customer ID from environment variables
+    api_key = os.environ.get("API_KEY")
+    customer_id = os.environ.get("CUSTOMER_ID")
+
+    if not api_key or not customer_id:
+        print("Please set API key and customer ID in environment variables.")
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Local transcript relay: one upstream session, many subscribers",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-u",
+        "--uri",
+        type=str,
+        metavar="URL",
+        help="Server URL",
+        default="wss://bodhi.navana.ai",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=8765, help="Bind port")
+    parser.add_argument(
+        "-f",
+        "--file",
+        dest="files",
+        action="append",
+        default=[],
+        help="wave/audio file to stream upstream on startup (can be repeated)",
+    )
+    parser.add_argument(
+        "-m", "--model", type=str, default="hi-banking-v2-8khz", help="Model for -f"
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=100,
+        help="Maximum number of queued messages per subscriber",
+    )
+    parser.add_argument(
+        "--drop-policy",
+        choices=DROP_POLICIES,
+        default="drop-oldest",
+        help="What to do when a subscriber's queue is full",
+    )
+    parser.add_argument(
+        "--keepalive",
+        type=float,
+        default=15.0,
+        help="Seconds between keepalive pings to idle subscribers",
+    )
+    parser.add_argument(
+        "--pending-timeout",
+        type=float,
+        default=60.0,
+        help="Seconds a subscription waits for a call that has not started before it is ended",
+    )
+
+    args = parser.parse_args()
+
+    app = web.Application()
+    app["uri"] = args.uri
+    app["model"] = args.model
+    app["files"] = args.files
+    app["request_headers"] = {"x-api-key": api_key, "x-customer-id": customer_id}
+    app["hub"] = TranscriptHub(args.queue_size, args.drop_policy)
+    app["keepalive"] = args.keepalive
+    app["pending_timeout"] = args.pending_timeout
+    app.cleanup_ctx.append(upstream_session)
+    app.router.add_get("/ingest", ingest_handler)
+    app.router.add_get("/calls", calls_handler)
+    app.router.add_get("/calls/{call_id}/ws", websocket_subscribe_handler)
+    app.router.add_get("/calls/{call_id}/events", sse_subscribe_handler)
+
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+COLUMNS = [
+    "call_id",
+    "segment_id",
+    "type",
+    "text",
+    "model",
+    "source",
+    "start_time",
+    "end_time",
+    "received_at",
+]
+
+
+class SQLiteWriter:
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+
+    def open(self):
+        # Opened by the caller so a bad path fails right away, and only used
+        # from the writer thread afterwards
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts ("
+            "call_id TEXT, segment_id TEXT, type TEXT, text TEXT, model TEXT, "
+            "source TEXT, start_time REAL, end_time REAL, received_at REAL)"
+        )
+        self.connection.commit()
+
+    def write(self, rows):
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO transcripts VALUES ({', '.join('?' * len(COLUMNS))})",
+                [tuple(row.get(column) for column in COLUMNS) for row in rows],
+            )
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+class ParquetWriter:
+    """
+    A Parquet file cannot be appended to. If the path already exists, rows
+    go to a new part next to it (transcripts.1.parquet, transcripts.2.parquet,
+    ...), so earlier runs are never overwritten.
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            print("Please install pyarrow first. You can use")
+            print()
+            print("  pip install pyarrow")
+            print()
+            sys.exit(-1)
+
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.schema = pyarrow.schema(
+            [
+                ("call_id", pyarrow.string()),
+                ("segment_id", pyarrow.string()),
+                ("type", pyarrow.string()),
+                ("text", pyarrow.string()),
+                ("model", pyarrow.string()),
+                ("source", pyarrow.string()),
+                ("start_time", pyarrow.float64()),
+                ("end_time", pyarrow.float64()),
+                ("received_at", pyarrow.float64()),
+            ]
+        )
+        self.writer = None
+
+    def open(self):
+        base, extension = os.path.splitext(self.path)
+        part = 0
+        while os.path.exists(self.path):
+            part += 1
+            self.path = f"{base}.{part}{extension}"
+        if part:
+            print(f"Transcript sink: writing to {self.path}", file=sys.stderr)
+        self.writer = self.pq.ParquetWriter(self.path, self.schema)
+
+    def write(self, rows):
+        # Every batch becomes one row group
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class TranscriptSink:
+    """
+    Collects transcript rows from the event loop and writes them in batches
+    from a background thread, so storage never blocks the loop.
+
+    add() only puts the row on a bounded queue. A batch is written once it
+    holds `batch_size` rows or `flush_interval` seconds have passed. When
+    the writer falls behind and `max_pending` rows are queued, new rows are
+    dropped and counted instead of growing memory. close() writes what is
+    left and waits for the thread.
+
+    The store is opened before the thread starts, so an unusable path
+    raises from the constructor instead of losing every row.
+    """
+
+    def __init__(self, writer, batch_size=500, flush_interval=1.0, max_pending=10000):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.writer.open()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, row):
+        try:
+            self.rows.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+        print(
+            f"Transcript sink: wrote {self.written} rows"
+            + (f", dropped {self.dropped}" if self.dropped else "")
+            + (f", failed to write {self.failed}" if self.failed else ""),
+            file=sys.stderr,
+        )
+
+    def _run(self):
+        try:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while not (self._closed.is_set() and self.rows.empty()):
+                try:
+                    batch.append(
+                        self.rows.get(timeout=max(0.0, deadline - time.monotonic()))
+                    )
+                except queue.Empty:
+                    pass
+
+                if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                    self._flush(batch)
+                    batch = []
+                    deadline = time.monotonic() + self.flush_interval
+            self._flush(batch)
+        finally:
+            self.writer.close()
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            self.writer.write(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Transcript sink: failed to write batch: {e}", file=sys.stderr)
+
+
+def create_sink(path, **kwargs):
+    """
+    Chooses the storage by file extension: .parquet for Parquet, anything
+    else for SQLite. Exits if the store cannot be opened.
+    """
+    if os.path.splitext(path)[1] == ".parquet":
+        writer = ParquetWriter(path)
+    else:
+        writer = SQLiteWriter(path)
+
+    try:
+        return TranscriptSink(writer, **kwargs)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Cannot open transcript sink {path}: {e}")
+        sys.exit(-1)
+
+
+def segment_row(response_data, model, source):
+    segment_meta = response_data.get("segment_meta") or {}
+    start_time = segment_meta.get("start_time")
+    timestamps = segment_meta.get("timestamps") or [0]
+    return {
+        "call_id": response_data.get("call_id"),
+        "segment_id": str(response_data.get("segment_id")),
+        "type": response_data.get("type"),
+        "text": response_data.get("text"),
+        "model": model,
+        "source": source,
+        "start_time": start_time,
+        "end_time": None if start_time is None else start_time + timestamps[-1],
+        "received_at": time.time(),
+    }
+
+
+def final_row(call_id, text, model, source):
+    return {
+        "call_id": call_id,
+        "segment_id": None,
+        "type": "final",
+        "text": text,
+        "model": model,
+        "source": source,
+        "start_time": None,
+        "end_time": None,
+        "received_at": time.time(),
+    }
+
+
+def session_recorder(sink, model, source):
+    """
+    Returns an on_response callback for streaming sessions that stores
+    every complete segment and, at the end of the stream, the final
+    transcript.
+    """
+    complete_sentences = []
+
+    def on_response(response_data):
+        transcript_text = response_data.get("text")
+        if response_data.get("type") == "complete" and transcript_text != "":
+            complete_sentences.append(transcript_text)
+            sink.add(segment_row(response_data, model, source))
+        if response_data.get("eos", False):
+            sink.add(
+                final_row(
+                    response_data.get("call_id"),
+                    ", ".join(complete_sentences),
+                    model,
+                    source,
+                )
+            )
+
+    return on_response
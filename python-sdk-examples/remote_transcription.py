@@ -1,6 +1,11 @@
+import argparse
 import asyncio
+import concurrent.futures
+import json
 import os
 import logging
+import time
+import requests
 from dotenv import load_dotenv
 from bodhi import (
     BodhiClient,
@@ -8,6 +13,12 @@ from bodhi import (
     TranscriptionResponse,
     LiveTranscriptionEvents,
 )
+from bodhi.utils.exceptions import (
+    AuthenticationError,
+    BodhiError,
+    ForbiddenError,
+    PaymentRequiredError,
+)
 
 # Configure logging
 logging.basicConfig(
@@ -40,7 +51,51 @@ async def on_close():
     logging.info("WebSocket connection closed.")
 
 
-async def main():
+# Errors that every other URL would hit as well, so they are not retried
+FATAL_ERRORS = (AuthenticationError, PaymentRequiredError, ForbiddenError)
+
+
+def is_transient_status(status):
+    # Timeouts, rate limiting and server errors
+    return status in (408, 429) or status >= 500
+
+
+def error_code(error):
+    # SDK errors carry the status code in a JSON message
+    if error.code is not None:
+        return error.code
+    try:
+        return json.loads(str(error)).get("code")
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+
+def is_transient(error):
+    """
+    Whether a failed URL may succeed on retry: network errors, and 408, 429
+    and 5xx from the audio host or the service. The exception chain is
+    checked, since errors may be wrapped.
+    """
+    while error is not None:
+        if isinstance(error, requests.exceptions.HTTPError):
+            return error.response is not None and is_transient_status(
+                error.response.status_code
+            )
+        if isinstance(
+            error,
+            (requests.exceptions.ConnectionError, requests.exceptions.Timeout),
+        ):
+            return True
+        if isinstance(error, BodhiError):
+            code = error_code(error)
+            return isinstance(code, int) and is_transient_status(code)
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def check_credentials():
     if not API_KEY or not CUSTOMER_ID:
         logging.error(
             "Please set BODHI_API_KEY and BODHI_CUSTOMER_ID environment variables"
@@ -49,7 +104,11 @@ async def main():
             "Please set BODHI_API_KEY and BODHI_CUSTOMER_ID environment variables"
         )
 
-    client = BodhiClient(api_key=API_KEY, customer_id=CUSTOMER_ID)
+
+async def main(uri=None, model="hi-banking-v2-8khz"):
+    check_credentials()
+
+    client = BodhiClient(api_key=API_KEY, customer_id=CUSTOMER_ID, uri=uri)
 
     # Register event listeners
     client.on(LiveTranscriptionEvents.Transcript, on_transcript)
@@ -60,7 +119,7 @@ async def main():
 
     # Example configuration
     config = TranscriptionConfig(
-        model="hi-banking-v2-8khz",
+        model=model,
     )
 
     # Example with remote URL
@@ -75,5 +134,244 @@ async def main():
         logging.error(f"Error during transcription: {str(e)}")
 
 
+def content_length(audio_url):
+    # Only used for the throughput report, object stores that refuse HEAD
+    # requests are still transcribed
+    try:
+        response = requests.head(audio_url, allow_redirects=True, timeout=30)
+        return int(response.headers.get("Content-Length", 0)) or None
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+async def transcribe_url(audio_url, model, uri):
+    """
+    Transcribes one URL with a client of its own.
+
+    Returns:
+    - tuple: (call_id, transcript)
+    """
+    client = BodhiClient(api_key=API_KEY, customer_id=CUSTOMER_ID, uri=uri)
+    complete_sentences = []
+    errors = []
+    result = {}
+
+    async def on_url_transcript(response: TranscriptionResponse):
+        if response.type == "complete" and response.text != "":
+            complete_sentences.append(response.text)
+        if response.eos:
+            result["call_id"] = response.call_id
+
+    async def on_url_error(e: Exception):
+        errors.append(e)
+
+    client.on(LiveTranscriptionEvents.Transcript, on_url_transcript)
+    client.on(LiveTranscriptionEvents.Error, on_url_error)
+
+    try:
+        # The SDK sets the sample rate of the file on the config, so every
+        # URL gets its own
+        await client.transcribe_remote_url(
+            audio_url, config=TranscriptionConfig(model=model)
+        )
+    except TypeError as e:
+        # The SDK fails with a TypeError while reporting a failed download,
+        # report the download error instead
+        if isinstance(e.__context__, requests.exceptions.RequestException):
+            raise e.__context__ from None
+        raise
+    finally:
+        # The SDK leaves its HTTP session open when a transcription fails
+        session = client.websocket_handler.session
+        if session is not None and not session.closed:
+            await session.close()
+
+    # Download and server errors are emitted as events and not raised
+    if errors:
+        raise errors[0]
+    if "call_id" not in result:
+        raise ConnectionError(f"Stream of {audio_url} ended without a final result")
+    return result["call_id"], ", ".join(complete_sentences)
+
+
+def transcribe_url_in_thread(audio_url, model, uri):
+    """
+    transcribe_remote_url downloads the URL with a blocking request, and a
+    server error cancels every task of the event loop it runs on. Running
+    each URL on an event loop of its own keeps the other URLs unaffected.
+    """
+    size = content_length(audio_url)
+    start = time.monotonic()
+    call_id, text = asyncio.run(transcribe_url(audio_url, model, uri))
+    return {
+        "call_id": call_id,
+        "text": text,
+        "seconds": time.monotonic() - start,
+        "bytes": size,
+    }
+
+
+def read_manifest(manifest_path):
+    # One URL per line, blank lines and lines starting with # are skipped
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return [
+            line.strip()
+            for line in f
+            if line.strip() and not line.strip().startswith("#")
+        ]
+
+
+def read_progress(progress_path):
+    done = set()
+    if os.path.exists(progress_path):
+        with open(progress_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line of an interrupted run may be incomplete
+                    continue
+                if record.get("status") == "done":
+                    done.add(record["url"])
+    return done
+
+
+def throughput(size, seconds):
+    if not size or not seconds:
+        return "unknown size"
+    return f"{size / 1024:.0f} KB at {size / 1024 / seconds:.1f} KB/s"
+
+
+async def run_manifest(args):
+    """
+    Transcribes every URL of the manifest that is not yet recorded as done
+    in the progress file, with at most args.concurrency URLs in flight.
+    """
+    check_credentials()
+
+    # The SDK logs every connection at INFO level
+    logging.getLogger("bodhi").setLevel(logging.WARNING)
+
+    progress_path = args.progress or f"{args.manifest}.progress.jsonl"
+    urls = read_manifest(args.manifest)
+    done = read_progress(progress_path)
+    pending = [url for url in urls if url not in done]
+    if done:
+        logging.info(
+            f"Skipping {len(urls) - len(pending)} URLs already done in {progress_path}"
+        )
+
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency)
+    queue = iter(pending)
+    summary = {"done": 0, "failed": 0, "bytes": 0}
+    stopped = []
+    start = time.monotonic()
+
+    with open(progress_path, "a", encoding="utf-8") as progress:
+
+        def record(entry):
+            progress.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            progress.flush()
+
+        async def worker():
+            for audio_url in queue:
+                if stopped:
+                    return
+                for attempt in range(args.retries + 1):
+                    try:
+                        result = await loop.run_in_executor(
+                            executor,
+                            transcribe_url_in_thread,
+                            audio_url,
+                            args.model,
+                            args.uri,
+                        )
+                    except FATAL_ERRORS as e:
+                        logging.error(f"Stopping: {e}")
+                        stopped.append(e)
+                        return
+                    except Exception as e:
+                        if attempt < args.retries and is_transient(e):
+                            delay = 2**attempt
+                            logging.warning(
+                                f"Failed {audio_url} ({e}), retrying in {delay}s"
+                            )
+                            await asyncio.sleep(delay)
+                            continue
+                        logging.error(f"Failed {audio_url}: {e}")
+                        summary["failed"] += 1
+                        record({"url": audio_url, "status": "failed", "error": str(e)})
+                        break
+
+                    summary["done"] += 1
+                    summary["bytes"] += result["bytes"] or 0
+                    logging.info(
+                        f"Done {audio_url} in {result['seconds']:.2f}s, "
+                        f"{throughput(result['bytes'], result['seconds'])}"
+                    )
+                    record({"url": audio_url, "status": "done", **result})
+                    break
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        finally:
+            executor.shutdown(wait=False)
+
+    elapsed = time.monotonic() - start
+    logging.info(
+        f"Transcribed {summary['done']} of {len(pending)} URLs in {elapsed:.2f}s "
+        f"({summary['failed']} failed), {throughput(summary['bytes'], elapsed)}. "
+        f"Progress saved to {progress_path}"
+    )
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="Transcribe a remote URL, or every URL of a manifest",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        help="Text file with one audio URL per line",
+    )
+    parser.add_argument(
+        "-n",
+        "--concurrency",
+        type=int,
+        default=4,
+        help="URLs transcribed at the same time",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="Retries of a URL that failed with a network error, 429 or 5xx, with exponential backoff",
+    )
+    parser.add_argument(
+        "--progress",
+        type=str,
+        help="JSONL file of finished URLs, used to resume. Defaults to <manifest>.progress.jsonl",
+    )
+    parser.add_argument(
+        "-m",
+        "--model",
+        type=str,
+        default="hi-banking-v2-8khz",
+        help="Model name for transcription",
+    )
+    parser.add_argument(
+        "--uri",
+        type=str,
+        help="WebSocket URI of the service (default: wss://bodhi.navana.ai)",
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = get_args()
+    if args.manifest:
+        asyncio.run(run_manifest(args))
+    else:
+        asyncio.run(main(args.uri, args.model))